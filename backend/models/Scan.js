@@ -91,6 +91,14 @@ const scanSchema = new mongoose.Schema(
         default: Date.now,
       },
     },
+    memory: {
+      predictedPeakBytes: Number, // Header-based estimate from memory_estimate.py
+      workingBytes: Number,
+      peakStage: String,
+      actualPeakBytes: Number, // Peak RSS reported by inference.py
+      exclusive: Boolean, // Ran alone because it exceeded the memory budget
+      estimatedAt: Date,
+    },
     results: {
       overallRisk: {
         type: String,
@@ -0,0 +1,123 @@
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+# Cold-start budget per entry point (milliseconds, best of --runs) and modules it must
+# not pull in at import time. Raise a budget only together with the change that needs it.
+ENTRY_POINTS = {
+    "memory_estimate": {
+        "budget_ms": 200,
+        "forbidden": ["torch", "monai", "SimpleITK", "pydicom", "nibabel", "numpy"]
+    },
+    "preprocessing": {
+        "budget_ms": 400,
+        "forbidden": ["torch", "monai", "SimpleITK", "pydicom", "nibabel"]
+    },
+    "inference": {
+        "budget_ms": 4000,
+        "forbidden": ["monai", "SimpleITK", "pydicom", "nibabel"]
+    },
+    "evaluate_cascade": {
+        "budget_ms": 4000,
+        "forbidden": ["monai", "SimpleITK", "pydicom", "nibabel"]
+    }
+}
+
+
+def parse_importtime(stderr):
+    """Parse `python -X importtime` output into (depth, name, self_us, cumulative_us) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module, runs=3):
+    """Import a module in fresh interpreters and return the fastest run's breakdown"""
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=HERE, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ""
+            raise RuntimeError(f"Importing {module} failed: {last_line}")
+
+        rows = parse_importtime(proc.stderr)
+        total_us = next(cum for depth, name, _, cum in rows if depth == 0 and name == module)
+        if best is None or total_us < best["total_us"]:
+            best = {"total_us": total_us, "rows": rows}
+
+    loaded = {name.split(".")[0] for _, name, _, _ in best["rows"]}
+    heaviest = sorted(
+        ((name, cum) for depth, name, _, cum in best["rows"] if depth == 1),
+        key=lambda item: item[1], reverse=True
+    )[:5]
+    return {
+        "total_ms": best["total_us"] / 1000,
+        "loaded": loaded,
+        "heaviest": [{"module": name, "ms": cum / 1000} for name, cum in heaviest]
+    }
+
+
+def check(module, spec, runs):
+    result = measure(module, runs)
+    forbidden = sorted(set(spec["forbidden"]) & result["loaded"])
+    return {
+        "entry_point": module,
+        "total_ms": round(result["total_ms"], 1),
+        "budget_ms": spec["budget_ms"],
+        "over_budget": result["total_ms"] > spec["budget_ms"],
+        "forbidden_loaded": forbidden,
+        "heaviest": result["heaviest"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import-time cold start of the Python entry points")
+    parser.add_argument("entry_points", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per entry point; best run counts")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    reports = []
+    failed = False
+    for module in args.entry_points:
+        if module not in ENTRY_POINTS:
+            parser.error(f"Unknown entry point: {module}")
+        try:
+            report = check(module, ENTRY_POINTS[module], args.runs)
+        except RuntimeError as e:
+            report = {"entry_point": module, "error": str(e)}
+        failed |= bool(report.get("error") or report["over_budget"] or report["forbidden_loaded"])
+        reports.append(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            if "error" in report:
+                print(f"{report['entry_point']:<18} ERROR  {report['error']}")
+                continue
+            status = "OK" if not (report["over_budget"] or report["forbidden_loaded"]) else "FAIL"
+            print(f"{report['entry_point']:<18} {status:<5} {report['total_ms']:>8.1f} ms "
+                  f"(budget {report['budget_ms']} ms)")
+            if report["forbidden_loaded"]:
+                print(f"{'':<18} loads forbidden modules: {', '.join(report['forbidden_loaded'])}")
+            for item in report["heaviest"]:
+                print(f"{'':<18}   {item['module']:<24} {item['ms']:>8.1f} ms")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,2 @@
-IMAGE_SIZE = (128, 128, 64) 
\ No newline at end of file
+IMAGE_SIZE = (128, 128, 64)
+COARSE_IMAGE_SIZE = (64, 64, 32)  # Screening tier of the resolution cascade
\ No newline at end of file
@@ -0,0 +1,57 @@
+import torch
+from torch.utils.data import Dataset
+from monai.data import MetaTensor
+import logging
+
+from preprocessing import load_and_preprocess_nifti, convert_labels_to_targets
+
+logger = logging.getLogger(__name__)
+
+
+class RSNADataset(Dataset):
+    def __init__(self, metadata_list, transforms=None, has_labels=True):
+        """
+        Initialize the dataset
+        
+        Args:
+            metadata_list: List of dictionaries containing scan metadata
+            transforms: Optional transforms to apply
+            has_labels: Whether the dataset includes labels
+        """
+        self.metadata_list = metadata_list
+        self.transforms = transforms
+        self.has_labels = has_labels
+
+    def __len__(self):
+        return len(self.metadata_list)
+
+    def __getitem__(self, idx):
+        entry = self.metadata_list[idx]
+        try:
+            nifti_path = entry["nifti_path"]
+            
+            # Load with validation
+            volume = load_and_preprocess_nifti(nifti_path)
+            
+            # Apply transforms if they exist
+            if self.transforms:
+                volume = self.transforms(volume)
+            
+            # Create sample
+            sample = {"image": MetaTensor(volume)}
+            
+            if self.has_labels:
+                targets = convert_labels_to_targets(entry['labels'])
+                sample["label"] = torch.tensor([
+                    targets["bowel"],
+                    targets["extra"],
+                    targets["kidney"],
+                    targets["liver"],
+                    targets["spleen"]
+                ], dtype=torch.float32)
+                
+            return sample
+            
+        except Exception as e:
+            logger.error(f"Failed to process {nifti_path}: {str(e)}")
+            raise ValueError(f"Error processing {nifti_path}: {str(e)}")
@@ -0,0 +1,191 @@
+import sys
+import csv
+import json
+import time
+import argparse
+import logging
+from pathlib import Path
+
+import torch
+
+from inference import (
+    configure_runtime,
+    load_model,
+    run_inference,
+    CUSTOM_THRESHOLDS,
+    DEFAULT_TTA_FNS,
+    DEFAULT_CASCADE_MARGIN,
+    NEGATIVE_STATUSES
+)
+
+logger = logging.getLogger(__name__)
+
+# Ground-truth injury columns (RSNA train.csv layout) for each reported head
+INJURY_COLUMNS = {
+    "bowel": ["bowel_injury"],
+    "extravasation": ["extravasation_injury"],
+    "liver": ["liver_low", "liver_high"],
+    "kidney": ["kidney_low", "kidney_high"],
+    "spleen": ["spleen_low", "spleen_high"]
+}
+
+SCAN_SUFFIXES = [".nii.gz", ".nii", ".zip", ""]
+
+
+def find_scan(scan_dir, patient_id):
+    """Locate a patient's scan as <id>.nii.gz, <id>.nii, <id>.zip or a DICOM directory <id>/"""
+    for suffix in SCAN_SUFFIXES:
+        candidate = Path(scan_dir) / f"{patient_id}{suffix}"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def is_injured(row, head):
+    return any(int(float(row[col])) == 1 for col in INJURY_COLUMNS[head])
+
+
+def is_predicted_positive(results, head):
+    return results[head]["status"] != NEGATIVE_STATUSES[head]
+
+
+def timed_inference(scan_path, model, device, **kwargs):
+    start = time.perf_counter()
+    results = run_inference(scan_path, model, device, **kwargs)
+    return results, (time.perf_counter() - start) * 1000
+
+
+def sensitivity(true_positives, positives):
+    return true_positives / positives if positives else None
+
+
+def summarize(records):
+    """Aggregate per-scan records into latency and sensitivity figures"""
+    heads = list(INJURY_COLUMNS) + ["any_injury"]
+    summary = {
+        "scans": len(records),
+        "escalated": sum(1 for r in records if r["tier"] == "full"),
+        "full_ms_total": sum(r["full_ms"] for r in records),
+        "cascade_ms_total": sum(r["cascade_ms"] for r in records),
+        "sensitivity": {}
+    }
+    summary["latency_saved_ms"] = summary["full_ms_total"] - summary["cascade_ms_total"]
+    summary["latency_saved_pct"] = (
+        100 * summary["latency_saved_ms"] / summary["full_ms_total"] if summary["full_ms_total"] else 0.0
+    )
+
+    for head in heads:
+        positives = [r for r in records if r["truth"][head]]
+        full_tp = sum(1 for r in positives if r["full_pred"][head])
+        cascade_tp = sum(1 for r in positives if r["cascade_pred"][head])
+        full_sens = sensitivity(full_tp, len(positives))
+        cascade_sens = sensitivity(cascade_tp, len(positives))
+        summary["sensitivity"][head] = {
+            "positives": len(positives),
+            "full": full_sens,
+            "cascade": cascade_sens,
+            "delta": cascade_sens - full_sens if positives else None
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare full-resolution inference against the resolution cascade on a labelled archive"
+    )
+    parser.add_argument("labels_csv", help="CSV with patient_id and RSNA injury label columns")
+    parser.add_argument("scan_dir", help="Directory containing one scan per patient_id")
+    parser.add_argument("model_path")
+    parser.add_argument("--coarse-model", default=None, help="Companion checkpoint for the coarse tier")
+    parser.add_argument("--cascade-margin", type=float, default=DEFAULT_CASCADE_MARGIN)
+    parser.add_argument("--tta", action="store_true")
+    parser.add_argument("--thresholds", action="store_true")
+    parser.add_argument("--limit", type=int, default=None, help="Only evaluate the first N patients")
+    args = parser.parse_args()
+    configure_runtime()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model = load_model(args.model_path).to(device)
+    coarse_model = load_model(args.coarse_model).to(device) if args.coarse_model else None
+
+    common = {
+        "tta_fns": DEFAULT_TTA_FNS if args.tta else None,
+        "thresholds": CUSTOM_THRESHOLDS if args.thresholds else None
+    }
+
+    with open(args.labels_csv, newline="") as f:
+        rows = list(csv.DictReader(f))
+    if args.limit:
+        rows = rows[:args.limit]
+
+    cascade_kwargs = {
+        "cascade": True,
+        "coarse_model": coarse_model,
+        "cascade_margin": args.cascade_margin,
+        **common
+    }
+
+    # Untimed warm-up of both tiers so CUDA/cuDNN init and transform building
+    # are not charged to whichever mode happens to run first. Unreadable scans are
+    # skipped here just as they are in the timed loop.
+    for row in rows:
+        warmup_path = find_scan(args.scan_dir, row["patient_id"])
+        if warmup_path is None:
+            continue
+        try:
+            run_inference(warmup_path, model, device, **common)
+            # A margin of 1.0 always escalates, so the coarse and full pipelines both warm up
+            run_inference(warmup_path, model, device, **{**cascade_kwargs, "cascade_margin": 1.0})
+            break
+        except Exception as e:
+            logger.warning(f"Warm-up on patient {row['patient_id']} failed, trying the next scan: {str(e)}")
+
+    records = []
+    for i, row in enumerate(rows):
+        patient_id = row["patient_id"]
+        scan_path = find_scan(args.scan_dir, patient_id)
+        if scan_path is None:
+            logger.warning(f"No scan found for patient {patient_id}, skipping")
+            continue
+
+        try:
+            # Alternate which mode reads the scan first so page-cache hits even out
+            if i % 2 == 0:
+                full_results, full_ms = timed_inference(scan_path, model, device, **common)
+                cascade_results, cascade_ms = timed_inference(scan_path, model, device, **cascade_kwargs)
+            else:
+                cascade_results, cascade_ms = timed_inference(scan_path, model, device, **cascade_kwargs)
+                full_results, full_ms = timed_inference(scan_path, model, device, **common)
+        except Exception as e:
+            logger.error(f"Patient {patient_id} failed: {str(e)}")
+            continue
+
+        truth = {head: is_injured(row, head) for head in INJURY_COLUMNS}
+        full_pred = {head: is_predicted_positive(full_results, head) for head in INJURY_COLUMNS}
+        cascade_pred = {head: is_predicted_positive(cascade_results, head) for head in INJURY_COLUMNS}
+        truth["any_injury"] = any(truth.values())
+        full_pred["any_injury"] = any(full_pred.values())
+        cascade_pred["any_injury"] = any(cascade_pred.values())
+
+        records.append({
+            "patient_id": patient_id,
+            "tier": cascade_results["cascade"]["tier"],
+            "full_ms": full_ms,
+            "cascade_ms": cascade_ms,
+            "truth": truth,
+            "full_pred": full_pred,
+            "cascade_pred": cascade_pred
+        })
+        logger.info(
+            f"{patient_id}: tier={records[-1]['tier']} full={full_ms:.0f}ms cascade={cascade_ms:.0f}ms"
+        )
+
+    if not records:
+        print(json.dumps({"error": "No scans evaluated"}), file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(summarize(records), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,12 @@ import zipfile
 import tempfile
 import shutil
 import logging
-from preprocessing import convert_dicom_to_nifti, test_transforms, RSNADataset, verify_dicom_files
-from model import DenseNet121model
-import nibabel as nib
+import time
+from preprocessing import (
+    convert_dicom_to_nifti, build_test_transforms, build_coarse_test_transforms,
+    verify_dicom_files, load_and_preprocess_nifti, repair_nifti, discover_series
+)
 import os
-# Add these near the top of inference.py
-import torch
-from functools import partial
 from typing import List, Callable
 
 # TTA Functions
@@ -44,6 +43,34 @@ CUSTOM_THRESHOLDS = {
     "spleen": {"thresholds": [0.12, 0.50, 0.55]}
 }
 
+# Fallback thresholds used when no custom thresholds are requested
+DEFAULT_THRESHOLDS = {
+    "bowel": {"thresholds": [0.5]},  # Single threshold for binary classification
+    "extra": {"thresholds": [0.5]},
+    "liver": {"thresholds": [0.33, 0.33, 0.33]},  # Equal thresholds for multi-class
+    "kidney": {"thresholds": [0.33, 0.33, 0.33]},
+    "spleen": {"thresholds": [0.33, 0.33, 0.33]}
+}
+
+# Adaptive TTA: probabilities closer than this to a cutoff trigger extra views
+DEFAULT_TTA_MARGIN = 0.1
+
+# Resolution cascade: coarse predictions closer than this to a cutoff are escalated
+DEFAULT_CASCADE_MARGIN = 0.15
+
+# Study mode: how per-series probabilities are combined into one prediction
+AGGREGATION_RULES = ("max", "mean")
+DEFAULT_AGGREGATION = "max"  # Any injured series flags the study
+
+# Statuses that count as a negative finding for each reported head
+NEGATIVE_STATUSES = {
+    "bowel": "Healthy",
+    "extravasation": "Absent",
+    "liver": "Healthy",
+    "kidney": "Healthy",
+    "spleen": "Healthy"
+}
+
 def _tta_forward_batch(model, inputs, tta_fns: List[Callable] = None):
     """Run a batch through the model with multiple deterministic TTA transforms"""
     if not tta_fns:
@@ -60,19 +87,82 @@ def _tta_forward_batch(model, inputs, tta_fns: List[Callable] = None):
         avg_logits[k] = torch.stack([d[k] for d in logits_per_tta], dim=0).mean(dim=0)
     return avg_logits
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+def _uncertain_mask(outputs, thresholds=None, margin=DEFAULT_TTA_MARGIN):
+    """Flag batch items whose postprocess_output decision could flip under a small perturbation
+
+    An item is uncertain if any head's probability sits within margin of its threshold,
+    or if a multi-class head has two classes over threshold whose probabilities are
+    within margin of each other (the argmax between them is a coin toss).
+    """
+    if thresholds is None:
+        thresholds = DEFAULT_THRESHOLDS
+
+    batch_size = next(iter(outputs.values())).shape[0]
+    mask = torch.zeros(batch_size, dtype=torch.bool, device=next(iter(outputs.values())).device)
+
+    for head, logits in outputs.items():
+        head_thresholds = thresholds.get(head, DEFAULT_THRESHOLDS[head])["thresholds"]
+        if logits.shape[1] == 1:
+            probs = torch.sigmoid(logits)
+        else:
+            probs = torch.softmax(logits, dim=1)
+        cutoffs = torch.tensor(head_thresholds[:probs.shape[1]], dtype=probs.dtype, device=probs.device)
+        mask |= ((probs - cutoffs).abs() < margin).any(dim=1)
+
+        if probs.shape[1] > 1:
+            valid = probs >= cutoffs
+            top2 = probs.masked_fill(~valid, float('-inf')).topk(2, dim=1).values
+            mask |= (valid.sum(dim=1) >= 2) & ((top2[:, 0] - top2[:, 1]) < margin)
+
+    return mask
+
+def _adaptive_tta_forward_batch(model, inputs, tta_fns: List[Callable] = None,
+                                thresholds=None, margin=DEFAULT_TTA_MARGIN):
+    """Run the first TTA view for the whole batch and the rest only for uncertain items
+
+    Returns the averaged logits and the number of views used per batch item.
+    """
+    if not tta_fns:
+        tta_fns = DEFAULT_TTA_FNS
+
+    outputs = model(tta_fns[0](inputs))
+    views = torch.ones(inputs.shape[0], dtype=torch.long)
+
+    uncertain = _uncertain_mask(outputs, thresholds, margin)
+    if len(tta_fns) == 1 or not uncertain.any():
+        return outputs, views.tolist()
+
+    # Only the borderline scans pay for the remaining views
+    idx = uncertain.nonzero(as_tuple=True)[0]
+    subset = inputs[idx]
+    logits_per_tta = [{k: v[idx] for k, v in outputs.items()}]
+    for fn in tta_fns[1:]:
+        logits_per_tta.append(model(fn(subset)))
+
+    avg_logits = {}
+    for k in outputs.keys():
+        merged = outputs[k].clone()
+        merged[idx] = torch.stack([d[k] for d in logits_per_tta], dim=0).mean(dim=0)
+        avg_logits[k] = merged
+    views[idx.cpu()] = len(tta_fns)
+    return avg_logits, views.tolist()
+
 logger = logging.getLogger(__name__)
 
-# Set random seeds for reproducibility
-torch.manual_seed(42)
-np.random.seed(42)
-random.seed(42)
+def configure_runtime():
+    """Logging and seeding for command-line entry points; not run on import"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    # Set random seeds for reproducibility
+    torch.manual_seed(42)
+    np.random.seed(42)
+    random.seed(42)
 
 def load_model(model_path):
     """Load and prepare the model with proper error handling"""
     logger.info(f"Loading model weights from: {model_path}")
     try:
+        from model import DenseNet121model
         model = DenseNet121model()
         state_dict = torch.load(model_path, map_location='cpu', weights_only=False)
         
@@ -94,13 +184,7 @@ def postprocess_output(outputs, thresholds=None):
     """Updated to handle thresholds properly"""
     # Default thresholds if none provided
     if thresholds is None:
-        thresholds = {
-            "bowel": {"thresholds": [0.5]},  # Single threshold for binary classification
-            "extra": {"thresholds": [0.5]},
-            "liver": {"thresholds": [0.33, 0.33, 0.33]},  # Equal thresholds for multi-class
-            "kidney": {"thresholds": [0.33, 0.33, 0.33]},
-            "spleen": {"thresholds": [0.33, 0.33, 0.33]}
-        }
+        thresholds = DEFAULT_THRESHOLDS
     elif isinstance(thresholds, dict):
         # Ensure each organ has proper threshold structure
         for organ in ["bowel", "extra", "liver", "kidney", "spleen"]:
@@ -197,7 +281,49 @@ def process_dicom_zip(zip_path, temp_dir):
         raise RuntimeError(f"ZIP processing failed: {str(e)}")
 
 
-def run_inference(scan_path, model, device='cpu', tta_fns=None, thresholds=None):
+def _load_or_repair_nifti(nifti_path, repaired_path):
+    """Return a loadable NIfTI path, writing a repaired copy if the original fails to load"""
+    try:
+        # First try normal loading
+        import nibabel as nib
+        nib.load(str(nifti_path))
+        return Path(nifti_path)
+    except Exception as e:
+        logger.warning(f"Initial NIfTI load failed, attempting repair: {str(e)}")
+        # Attempt repair if normal load fails
+        repair_nifti(nifti_path, repaired_path)
+        return Path(repaired_path)
+
+def _to_input_tensor(volume, transforms, device):
+    """Apply an inference transform pipeline and add the batch dimension"""
+    from monai.data import MetaTensor
+    return MetaTensor(transforms(volume)).unsqueeze(0).to(device)
+
+def _forward(model, input_tensor, tta_fns=None, thresholds=None,
+             adaptive_tta=False, tta_margin=DEFAULT_TTA_MARGIN):
+    """Run the model (optionally with TTA) and return the logits and views used per batch item"""
+    tta_views = [1] * input_tensor.shape[0]
+    with torch.no_grad():
+        if tta_fns and adaptive_tta:
+            outputs, tta_views = _adaptive_tta_forward_batch(
+                model, input_tensor, tta_fns, thresholds, tta_margin
+            )
+        elif tta_fns:
+            outputs = _tta_forward_batch(model, input_tensor, tta_fns)
+            tta_views = [len(tta_fns)] * input_tensor.shape[0]
+        else:
+            outputs = model(input_tensor)
+    return outputs, tta_views
+
+def _has_positive_finding(results):
+    """True if any head reports something other than its healthy status"""
+    return any(results[head]["status"] != status for head, status in NEGATIVE_STATUSES.items())
+
+def run_inference(scan_path, model, device='cpu', tta_fns=None, thresholds=None,
+                  adaptive_tta=False, tta_margin=DEFAULT_TTA_MARGIN,
+                  cascade=False, coarse_model=None, cascade_margin=DEFAULT_CASCADE_MARGIN):
+    if adaptive_tta and not tta_fns:
+        tta_fns = DEFAULT_TTA_FNS
     temp_dir = None
     try:
         scan_path = Path(scan_path).absolute()
@@ -211,19 +337,11 @@ def run_inference(scan_path, model, device='cpu', tta_fns=None, thresholds=None)
         
         # Handle NIfTI input directly
         if not scan_path.is_dir():
-            try:
-                # First try normal loading
-                test_load = nib.load(str(scan_path))
-            except Exception as e:
-                logger.warning(f"Initial NIfTI load failed, attempting repair: {str(e)}")
-                # Attempt repair if normal load fails
-                if temp_dir:
-                    repaired_path = Path(temp_dir) / "repaired.nii.gz"
-                else:
-                    repaired_path = scan_path.parent / f"repaired_{scan_path.name}"
-                
-                repair_nifti(scan_path, repaired_path)
-                scan_path = repaired_path
+            if temp_dir:
+                repaired_path = Path(temp_dir) / "repaired.nii.gz"
+            else:
+                repaired_path = scan_path.parent / f"repaired_{scan_path.name}"
+            scan_path = _load_or_repair_nifti(scan_path, repaired_path)
         
         # Handle DICOM directory input
         else:
@@ -244,75 +362,375 @@ def run_inference(scan_path, model, device='cpu', tta_fns=None, thresholds=None)
         if not scan_path.exists():
             raise FileNotFoundError(f"Processed scan not found: {scan_path}")
 
-        # Create dataset entry
-        metadata_entry = {
-            "nifti_path": str(scan_path),
-            "labels": {
-                "bowel_injury": 0, "extravasation_injury": 0,
-                "kidney_healthy": 1, "kidney_low": 0, "kidney_high": 0,
-                "liver_healthy": 1, "liver_low": 0, "liver_high": 0,
-                "spleen_healthy": 1, "spleen_low": 0, "spleen_high": 0
+        # Load the volume once; each tier applies its own transforms
+        volume = load_and_preprocess_nifti(scan_path)
+        
+        # Coarse screening pass: low resolution, single view
+        cascade_info = None
+        if cascade:
+            start = time.perf_counter()
+            coarse_input = _to_input_tensor(volume, build_coarse_test_transforms(), device)
+            coarse_outputs, _ = _forward(coarse_model or model, coarse_input)
+            coarse_results = postprocess_output(coarse_outputs, thresholds)
+            coarse_ms = (time.perf_counter() - start) * 1000
+            
+            if _has_positive_finding(coarse_results):
+                reason = "positive"
+            elif _uncertain_mask(coarse_outputs, thresholds, cascade_margin).any():
+                reason = "uncertain"
+            else:
+                reason = None
+            
+            cascade_info = {
+                "tier": "full" if reason else "coarse",
+                "escalation_reason": reason,
+                "coarse_ms": coarse_ms,
+                "full_ms": None,
+                # The coarse tier is a single view; TTA only runs on escalation
+                "tta_applied": bool(reason and tta_fns)
             }
-        }
+            if reason is None:
+                coarse_results["cascade"] = cascade_info
+                if tta_fns:
+                    logger.info("Coarse tier decided the scan; requested TTA was not applied")
+                    coarse_results["tta"] = {
+                        "mode": "not_applied",
+                        "views": 1,
+                        "max_views": len(tta_fns)
+                    }
+                return coarse_results
+            logger.info(f"Escalating to full resolution ({reason} coarse prediction)")
         
-        # Run inference
-        temp_dataset = RSNADataset(
-            metadata_list=[metadata_entry],
-            transforms=test_transforms,
-            has_labels=False
+        start = time.perf_counter()
+        input_tensor = _to_input_tensor(volume, build_test_transforms(), device)
+        outputs, tta_views = _forward(
+            model, input_tensor, tta_fns, thresholds, adaptive_tta, tta_margin
         )
         
-        sample = temp_dataset[0]
-        input_tensor = sample["image"].unsqueeze(0).to(device)
+        results = postprocess_output(outputs, thresholds)
+        if cascade_info:
+            cascade_info["full_ms"] = (time.perf_counter() - start) * 1000
+            results["cascade"] = cascade_info
+        if tta_fns:
+            results["tta"] = {
+                "mode": "adaptive" if adaptive_tta else "full",
+                "views": tta_views[0],
+                "max_views": len(tta_fns)
+            }
+        return results
         
-        with torch.no_grad():
-            if tta_fns:
-                outputs = _tta_forward_batch(model, input_tensor, tta_fns)
+    finally:
+        if temp_dir and os.path.exists(temp_dir):
+            try:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            except Exception as e:
+                logger.warning(f"Failed to clean temp dir: {str(e)}")
+
+def aggregate_outputs(outputs, rule=DEFAULT_AGGREGATION):
+    """Combine per-series logits [S, C] into study-level logits [1, C]
+
+    Probabilities are aggregated per head and mapped back to logits so the result
+    can go straight into postprocess_output. For multi-class heads, "max" keeps the
+    lowest healthy probability and the highest low/high injury probabilities, then
+    renormalises.
+    """
+    if rule not in AGGREGATION_RULES:
+        raise ValueError(f"Unknown aggregation rule '{rule}', expected one of {AGGREGATION_RULES}")
+
+    eps = 1e-6
+    aggregated = {}
+    for head, logits in outputs.items():
+        if logits.shape[1] == 1:
+            probs = torch.sigmoid(logits)
+            agg = probs.max(dim=0).values if rule == "max" else probs.mean(dim=0)
+            aggregated[head] = torch.logit(agg.clamp(eps, 1 - eps)).unsqueeze(0)
+        else:
+            probs = torch.softmax(logits, dim=1)
+            if rule == "max":
+                agg = torch.cat([probs[:, :1].min(dim=0).values, probs[:, 1:].max(dim=0).values])
+                agg = agg / agg.sum()
             else:
-                outputs = model(input_tensor)
+                agg = probs.mean(dim=0)
+            aggregated[head] = torch.log(agg.clamp_min(eps)).unsqueeze(0)
+    return aggregated
+
+def _prepare_series_tensor(index, series, work_dir):
+    """Verify/convert or repair one discovered series, then apply test_transforms"""
+    work_dir = Path(work_dir)
+    if series["kind"] == "dicom":
+        try:
+            valid_files = verify_dicom_files(work_dir, dicom_files=series["files"])
+        except Exception as e:
+            raise RuntimeError(f"DICOM verification failed for series {series['series_id']}: {str(e)}")
+        nifti_path = convert_dicom_to_nifti(
+            work_dir, work_dir / f"series_{index}.nii.gz", dicom_files=valid_files
+        )
+    else:
+        nifti_path = _load_or_repair_nifti(series["path"], work_dir / f"repaired_{index}.nii.gz")
+    volume = load_and_preprocess_nifti(nifti_path)
+    return torch.as_tensor(build_test_transforms()(volume))
+
+def _prepare_series_parallel(series, work_dir, max_workers=None):
+    """Preprocess series on a thread pool, splitting torch's intra-op threads between workers
+
+    Returns one (tensor, error) pair per series, in order. A series that fails
+    gets (None, message) so it cannot take the rest of the study down with it.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def prepare(item):
+        index, entry = item
+        try:
+            return _prepare_series_tensor(index, entry, work_dir), None
+        except Exception as e:
+            logger.warning(f"Skipping series {entry['series_id']}: {str(e)}")
+            return None, str(e)
+
+    workers = max_workers or min(len(series), os.cpu_count() or 1)
+    # Each worker's resampling uses torch's shared intra-op pool; without a split,
+    # N workers each ask for every core
+    intra_op_threads = torch.get_num_threads()
+    torch.set_num_threads(max(1, intra_op_threads // workers))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(prepare, enumerate(series)))
+    finally:
+        torch.set_num_threads(intra_op_threads)
+
+def _score_series_sequential(series, work_dir, model, device, tta_fns=None, thresholds=None,
+                             adaptive_tta=False, tta_margin=DEFAULT_TTA_MARGIN):
+    """Baseline for --compare-sequential: preprocess and score one series at a time"""
+    start = time.perf_counter()
+    preprocess_ms = 0.0
+    for i, entry in enumerate(series):
+        prep_start = time.perf_counter()
+        tensor = _prepare_series_tensor(i, entry, work_dir)
+        preprocess_ms += (time.perf_counter() - prep_start) * 1000
+        _forward(model, tensor.unsqueeze(0).to(device), tta_fns, thresholds, adaptive_tta, tta_margin)
+    total_ms = (time.perf_counter() - start) * 1000
+    return {
+        "preprocess_ms": preprocess_ms,
+        "forward_ms": total_ms - preprocess_ms,
+        "total_ms": total_ms
+    }
+
+def run_study_inference(scan_path, model, device='cpu', tta_fns=None, thresholds=None,
+                        adaptive_tta=False, tta_margin=DEFAULT_TTA_MARGIN,
+                        aggregation=DEFAULT_AGGREGATION, max_workers=None, compare_sequential=False):
+    """Score every eligible series of a study in one batched forward pass
+
+    Returns the aggregated study-level prediction at the top level (same shape as
+    run_inference) plus a per-series breakdown under "series". Series that fail to
+    preprocess are listed there with an "error" and left out of the aggregate; only
+    a study with no usable series raises. With compare_sequential, the usable
+    series are scored again one at a time and both timings are reported under
+    "study".
+    """
+    if aggregation not in AGGREGATION_RULES:
+        raise ValueError(f"Unknown aggregation rule '{aggregation}', expected one of {AGGREGATION_RULES}")
+    if adaptive_tta and not tta_fns:
+        tta_fns = DEFAULT_TTA_FNS
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        scan_path = Path(scan_path).absolute()
+        
+        if str(scan_path).endswith('.zip'):
+            with zipfile.ZipFile(scan_path, 'r') as zip_ref:
+                zip_ref.extractall(temp_dir)
+            upload_dir = Path(temp_dir)
+        elif scan_path.is_dir():
+            upload_dir = scan_path
+        else:
+            upload_dir = None
         
-        return postprocess_output(outputs, thresholds)
+        if upload_dir is None:
+            series = [{"series_id": scan_path.name, "kind": "nifti", "description": "", "path": str(scan_path)}]
+        else:
+            series = discover_series(upload_dir)
+        if not series:
+            raise ValueError("No eligible series found in upload")
+        logger.info(f"Scoring {len(series)} series with '{aggregation}' aggregation")
+        
+        # Threads avoid re-importing torch/MONAI in worker processes; whether they
+        # actually beat one-at-a-time scoring is what --compare-sequential measures
+        parallel_dir = Path(temp_dir) / "parallel"
+        parallel_dir.mkdir()
+        start = time.perf_counter()
+        prepared = _prepare_series_parallel(series, parallel_dir, max_workers)
+        preprocess_ms = (time.perf_counter() - start) * 1000
+        
+        scored = [(entry, tensor) for entry, (tensor, _) in zip(series, prepared) if tensor is not None]
+        if not scored:
+            errors = "; ".join(f"{entry['series_id']}: {error}" for entry, (_, error) in zip(series, prepared))
+            raise RuntimeError(f"No series could be preprocessed ({errors})")
+        
+        start = time.perf_counter()
+        batch = torch.stack([tensor for _, tensor in scored]).to(device)
+        outputs, tta_views = _forward(model, batch, tta_fns, thresholds, adaptive_tta, tta_margin)
+        forward_ms = (time.perf_counter() - start) * 1000
+        tta_mode = "adaptive" if adaptive_tta else "full"
+        
+        series_results = []
+        i = 0
+        for entry, (tensor, error) in zip(series, prepared):
+            if tensor is None:
+                series_results.append({
+                    "series_id": entry["series_id"],
+                    "description": entry["description"],
+                    "error": error
+                })
+                continue
+            result = postprocess_output({k: v[i:i + 1] for k, v in outputs.items()}, thresholds)
+            result.update({
+                "series_id": entry["series_id"],
+                "description": entry["description"]
+            })
+            if tta_fns:
+                result["tta"] = {"mode": tta_mode, "views": tta_views[i], "max_views": len(tta_fns)}
+            series_results.append(result)
+            i += 1
+        
+        results = postprocess_output(aggregate_outputs(outputs, aggregation), thresholds)
+        if tta_fns:
+            # Views summed over the scored series, out of the views full TTA would have run
+            results["tta"] = {
+                "mode": tta_mode,
+                "views": sum(tta_views),
+                "max_views": len(tta_fns) * len(scored)
+            }
+        results["study"] = {
+            "aggregation": aggregation,
+            "num_series": len(scored),
+            "failed_series": len(series) - len(scored),
+            "preprocess_ms": preprocess_ms,
+            "forward_ms": forward_ms,
+            "total_ms": preprocess_ms + forward_ms
+        }
+        
+        # Runs after the batched path, so any page-cache benefit goes to the
+        # baseline and the reported speedup is conservative
+        if compare_sequential:
+            sequential_dir = Path(temp_dir) / "sequential"
+            sequential_dir.mkdir()
+            sequential = _score_series_sequential(
+                [entry for entry, _ in scored], sequential_dir, model, device, tta_fns, thresholds, adaptive_tta, tta_margin
+            )
+            results["study"]["sequential"] = sequential
+            results["study"]["speedup"] = sequential["total_ms"] / results["study"]["total_ms"]
+            logger.info(
+                f"Study scored in {results['study']['total_ms']:.0f} ms batched vs "
+                f"{sequential['total_ms']:.0f} ms sequential"
+            )
+        results["series"] = series_results
+        return results
         
     finally:
-        if temp_dir and os.path.exists(temp_dir):
+        if os.path.exists(temp_dir):
             try:
                 shutil.rmtree(temp_dir, ignore_errors=True)
             except Exception as e:
                 logger.warning(f"Failed to clean temp dir: {str(e)}")
 
+def _peak_rss_bytes():
+    """Peak resident set size of this process so far, or None if the platform can't say"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is kilobytes on Linux, bytes on macOS
+        return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return int(psutil.Process().memory_info().peak_wset)
+    except Exception:
+        return None
+
+def _get_arg_value(flag, default=None):
+    """Return the value following a command-line flag, or the default if absent"""
+    if flag in sys.argv:
+        idx = sys.argv.index(flag)
+        if idx + 1 < len(sys.argv):
+            return sys.argv[idx + 1]
+        raise ValueError(f"Missing value for {flag}")
+    return default
+
 def main():
+    configure_runtime()
     try:
         if len(sys.argv) < 3:
-            raise ValueError("Usage: inference.py <scan_path> <model_path> [--tta] [--thresholds]")
+            raise ValueError(
+                "Usage: inference.py <scan_path> <model_path> [--tta] [--adaptive-tta] [--tta-margin <value>] "
+                "[--thresholds] [--cascade] [--coarse-model <path>] [--cascade-margin <value>] "
+                "[--study] [--aggregation max|mean] [--study-workers <n>] [--compare-sequential]"
+            )
         
         scan_path = Path(sys.argv[1])
         model_path = Path(sys.argv[2])
         
         # Parse optional arguments
-        use_tta = "--tta" in sys.argv
+        use_adaptive_tta = "--adaptive-tta" in sys.argv
+        use_tta = "--tta" in sys.argv or use_adaptive_tta
         use_custom_thresholds = "--thresholds" in sys.argv
+        tta_margin = float(_get_arg_value("--tta-margin", DEFAULT_TTA_MARGIN))
+        use_cascade = "--cascade" in sys.argv or "--coarse-model" in sys.argv
+        cascade_margin = float(_get_arg_value("--cascade-margin", DEFAULT_CASCADE_MARGIN))
+        coarse_model_path = _get_arg_value("--coarse-model")
+        use_study = any(flag in sys.argv for flag in ("--study", "--aggregation", "--compare-sequential"))
+        aggregation = _get_arg_value("--aggregation", DEFAULT_AGGREGATION)
+        study_workers = _get_arg_value("--study-workers")
+        compare_sequential = "--compare-sequential" in sys.argv
+        
+        if use_study and use_cascade:
+            raise ValueError("--study and --cascade cannot be combined")
         
         if not scan_path.exists():
             raise FileNotFoundError(f"Scan path does not exist: {scan_path}")
         if not model_path.exists():
             raise FileNotFoundError(f"Model path does not exist: {model_path}")
+        if coarse_model_path and not Path(coarse_model_path).exists():
+            raise FileNotFoundError(f"Coarse model path does not exist: {coarse_model_path}")
         
         device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         logger.info(f"Using device: {device}")
         
         model = load_model(model_path).to(device)
+        coarse_model = load_model(coarse_model_path).to(device) if coarse_model_path else None
         
         # Configure TTA and thresholds
         tta_fns = DEFAULT_TTA_FNS if use_tta else None
         thresholds = CUSTOM_THRESHOLDS if use_custom_thresholds else None
         
-        results = run_inference(
-            scan_path, 
-            model, 
-            device,
-            tta_fns=tta_fns,
-            thresholds=thresholds
-        )
+        if use_study:
+            results = run_study_inference(
+                scan_path,
+                model,
+                device,
+                tta_fns=tta_fns,
+                thresholds=thresholds,
+                adaptive_tta=use_adaptive_tta,
+                tta_margin=tta_margin,
+                aggregation=aggregation,
+                max_workers=int(study_workers) if study_workers else None,
+                compare_sequential=compare_sequential
+            )
+        else:
+            results = run_inference(
+                scan_path, 
+                model, 
+                device,
+                tta_fns=tta_fns,
+                thresholds=thresholds,
+                adaptive_tta=use_adaptive_tta,
+                tta_margin=tta_margin,
+                cascade=use_cascade,
+                coarse_model=coarse_model,
+                cascade_margin=cascade_margin
+            )
+        
+        # The worker pairs this with the estimate it stored before admitting the scan
+        results["memory"] = {"actual_peak_bytes": _peak_rss_bytes()}
         
         print(json.dumps(results))
         
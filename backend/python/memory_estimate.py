@@ -0,0 +1,211 @@
+import os
+import io
+import sys
+import json
+import zipfile
+import math
+import logging
+from pathlib import Path
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Interpreter, torch, MONAI and model weights before any scan is touched
+BASE_BYTES = 1536 * 1024 ** 2
+
+# Bytes held per voxel at the peak of each preprocessing stage
+DICOM_BYTES_PER_VOXEL = 6            # SimpleITK int16 image + numpy copy + NIfTI write buffer
+LOAD_BYTES_PER_VOXEL = 12            # get_fdata() float64 + float32 copy
+RESAMPLE_INPUT_BYTES_PER_VOXEL = 8   # float32 input + Orientation copy
+RESAMPLE_OUTPUT_BYTES_PER_VOXEL = 16 # float32 output + sampling grid
+
+CALIBRATION_PATH = Path(os.environ.get(
+    "SMARTCT_MEMORY_CALIBRATION",
+    Path(__file__).resolve().parent / "memory_calibration.json"
+))
+
+
+def _is_dicom_bytes(header):
+    return len(header) >= 132 and header[128:132] == b'DICM'
+
+
+def _dicom_geometry(first_ds, n_slices):
+    """Shape and spacing from a DICOM header and the number of slices in the series"""
+    shape = (int(first_ds.Columns), int(first_ds.Rows), n_slices)
+    try:
+        zooms = (float(first_ds.PixelSpacing[1]), float(first_ds.PixelSpacing[0]), float(first_ds.SliceThickness))
+    except Exception:
+        zooms = (1.0, 1.0, 1.0)
+    return shape, zooms
+
+
+def read_scan_geometry(scan_path):
+    """Read volume shape and voxel spacing from headers only, without decoding pixel data
+
+    Returns a dict with 'shape' (spatial), 'frames' (product of any dimensions past
+    the third), 'zooms' and 'source' ('nifti', 'dicom' or 'dicom_zip').
+    """
+    scan_path = Path(scan_path)
+
+    if str(scan_path).endswith('.zip'):
+        import pydicom
+        with zipfile.ZipFile(scan_path, 'r') as zf:
+            dicom_members = []
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                with zf.open(info) as fp:
+                    if _is_dicom_bytes(fp.read(132)):
+                        dicom_members.append(info)
+            if not dicom_members:
+                raise ValueError("No DICOM files found in ZIP archive")
+            with zf.open(dicom_members[0]) as fp:
+                ds = pydicom.dcmread(io.BytesIO(fp.read()), stop_before_pixels=True)
+        shape, zooms = _dicom_geometry(ds, len(dicom_members))
+        return {"shape": shape, "frames": 1, "zooms": zooms, "source": "dicom_zip"}
+
+    if scan_path.is_dir():
+        import pydicom
+        dicom_files = []
+        for root, _, files in os.walk(scan_path):
+            for f in files:
+                file_path = os.path.join(root, f)
+                try:
+                    with open(file_path, 'rb') as fp:
+                        if _is_dicom_bytes(fp.read(132)):
+                            dicom_files.append(file_path)
+                except:
+                    continue
+        if not dicom_files:
+            raise ValueError("No DICOM files found (missing DICM prefix)")
+        ds = pydicom.dcmread(dicom_files[0], stop_before_pixels=True)
+        shape, zooms = _dicom_geometry(ds, len(dicom_files))
+        return {"shape": shape, "frames": 1, "zooms": zooms, "source": "dicom"}
+
+    # nib.load only parses the header; pixel data stays on disk until get_fdata()
+    import nibabel as nib
+    img = nib.load(str(scan_path))
+    shape = tuple(int(s) for s in img.shape[:3])
+    frames = math.prod(int(s) for s in img.shape[3:])
+    zooms = tuple(float(z) for z in img.header.get_zooms()[:3])
+    return {"shape": shape, "frames": frames, "zooms": zooms, "source": "nifti"}
+
+
+def load_calibration(path=CALIBRATION_PATH):
+    """Return the fitted base/scale/headroom, falling back to the uncalibrated model"""
+    calibration = {"base_bytes": BASE_BYTES, "scale": 1.0, "headroom_bytes": 0}
+    try:
+        with open(path) as f:
+            calibration.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable memory calibration {path}: {str(e)}")
+    return calibration
+
+
+def estimate_peak_memory(scan_path, calibration=None):
+    """Predict the peak RSS of inference.py for a scan from its header geometry"""
+    geometry = read_scan_geometry(scan_path)
+    voxels = math.prod(geometry["shape"])
+
+    # get_fdata() decodes every frame of a 4D file before frame 0 is taken
+    loaded_voxels = voxels * geometry["frames"]
+
+    # The transforms see an array without an affine, so Spacing runs on the native
+    # grid (treated as 1 mm) and its output has the same voxel count as its input
+    stages = {
+        "load": LOAD_BYTES_PER_VOXEL * loaded_voxels,
+        "resample": (RESAMPLE_INPUT_BYTES_PER_VOXEL + RESAMPLE_OUTPUT_BYTES_PER_VOXEL) * voxels,
+        "model_input": 4 * math.prod(config.IMAGE_SIZE)
+    }
+    if geometry["source"] != "nifti":
+        stages["dicom"] = DICOM_BYTES_PER_VOXEL * voxels
+    working_bytes = max(stages.values())
+
+    if calibration is None:
+        calibration = load_calibration()
+    predicted = (calibration["base_bytes"] + calibration["scale"] * working_bytes
+                 + calibration["headroom_bytes"])
+
+    return {
+        "source": geometry["source"],
+        "shape": list(geometry["shape"]),
+        "zooms": list(geometry["zooms"]),
+        "frames": geometry["frames"],
+        "voxels": voxels,
+        "peak_stage": max(stages, key=stages.get),
+        "working_bytes": int(working_bytes),
+        "predicted_peak_bytes": int(predicted)
+    }
+
+
+def calibrate(records_path, output_path=CALIBRATION_PATH):
+    """Fit base and scale to recorded (working_bytes, actual_peak_bytes) pairs
+
+    The records file is JSON lines as written by the inference worker. Headroom is
+    the largest under-prediction left after the fit.
+    """
+    working, actual = [], []
+    with open(records_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("working_bytes") and record.get("actual_peak_bytes"):
+                working.append(float(record["working_bytes"]))
+                actual.append(float(record["actual_peak_bytes"]))
+
+    if len(working) < 2:
+        raise ValueError(f"Need at least 2 records with actual peak RSS, found {len(working)}")
+
+    import numpy as np
+
+    x = np.array(working)
+    y = np.array(actual)
+    if np.ptp(x) > 0:
+        scale, base = np.polyfit(x, y, 1)
+    else:
+        scale, base = 1.0, float(np.mean(y - x))
+    residuals = y - (base + scale * x)
+
+    calibration = {
+        "base_bytes": int(base),
+        "scale": float(scale),
+        "headroom_bytes": int(max(0.0, residuals.max())),
+        "samples": len(working)
+    }
+    with open(output_path, 'w') as f:
+        json.dump(calibration, f, indent=2)
+    return calibration
+
+
+def main():
+    try:
+        if len(sys.argv) < 2:
+            raise ValueError("Usage: memory_estimate.py <scan_path> | --calibrate <records.jsonl>")
+
+        if sys.argv[1] == "--calibrate":
+            if len(sys.argv) < 3:
+                raise ValueError("Usage: memory_estimate.py --calibrate <records.jsonl>")
+            print(json.dumps(calibrate(sys.argv[2])))
+            return
+
+        scan_path = Path(sys.argv[1])
+        if not scan_path.exists():
+            raise FileNotFoundError(f"Scan path does not exist: {scan_path}")
+        print(json.dumps(estimate_peak_memory(scan_path)))
+
+    except Exception as e:
+        error_msg = {
+            "error": str(e),
+            "type": type(e).__name__
+        }
+        print(json.dumps(error_msg), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,51 @@
-import SimpleITK as sitk
-import nibabel as nib
 import numpy as np
-import nibabel as nib
-from torch.utils.data import Dataset
-from monai.data import MetaTensor 
-from monai.transforms import Compose, LoadImage, EnsureChannelFirst, EnsureType, Orientation, Spacing, Resize, NormalizeIntensity, ToTensor
+from functools import lru_cache
 from pathlib import Path
 import config  # Your image size config
 import logging
 import os
-import sys
-import tempfile
 
-# Add missing import at the top
-import pydicom
-import traceback
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# SimpleITK, nibabel, pydicom, torch and MONAI are imported inside the functions
+# that need them, so a NIfTI-only run never loads the DICOM stack and header-only
+# tools never load torch. inference.py and memory_estimate.py follow the same rule;
+# benchmark_imports.py enforces it. Logging is configured by the entry point, not on import.
 logger = logging.getLogger(__name__)
 
+# Series with fewer slices than this (scouts, localizers) are not scored in study mode
+MIN_SERIES_SLICES = 20
+
+
+def find_dicom_files(dicom_dir):
+    """Recursively list files carrying the DICM preamble"""
+    dicom_files = []
+    for root, _, files in os.walk(dicom_dir):
+        for f in files:
+            file_path = os.path.join(root, f)
+            try:
+                with open(file_path, 'rb') as fp:
+                    fp.seek(128)
+                    if fp.read(4) == b'DICM':
+                        dicom_files.append(file_path)
+            except:
+                continue
+    return dicom_files
 
 # Update the DICOM loading function
-def load_dicom_series(dicom_dir):
-    """Robust DICOM loading with multiple fallback methods"""
+def load_dicom_series(dicom_dir, dicom_files=None):
+    """Robust DICOM loading with multiple fallback methods
+
+    Pass dicom_files to load one series out of a directory holding several.
+    """
+    import SimpleITK as sitk
+    import pydicom
+
     try:
         # Method 1: Try SimpleITK's default reader
         reader = sitk.ImageSeriesReader()
         
         # Get all potential DICOM files
-        dicom_files = []
-        for root, _, files in os.walk(dicom_dir):
-            for f in files:
-                file_path = os.path.join(root, f)
-                try:
-                    with open(file_path, 'rb') as fp:
-                        fp.seek(128)
-                        if fp.read(4) == b'DICM':
-                            dicom_files.append(file_path)
-                except:
-                    continue
+        if dicom_files is None:
+            dicom_files = find_dicom_files(dicom_dir)
         
         if not dicom_files:
             raise ValueError("No DICOM files found (missing DICM prefix)")
@@ -93,25 +99,19 @@ def load_dicom_series(dicom_dir):
         logging.error(f"DICOM loading failed: {str(e)}")
         raise RuntimeError(f"Could not load DICOM series: {str(e)}")
     
-def convert_dicom_to_nifti(dicom_dir, output_path):
+def convert_dicom_to_nifti(dicom_dir, output_path, dicom_files=None):
     """Convert DICOM to NIfTI with proper orientation and metadata handling"""
+    import SimpleITK as sitk
+    import nibabel as nib
+    import pydicom
     
     try:
         # Load DICOM series
-        sitk_image = load_dicom_series(dicom_dir)
+        sitk_image = load_dicom_series(dicom_dir, dicom_files)
         
         # Get metadata from first DICOM file
-        dicom_files = []
-        for root, _, files in os.walk(dicom_dir):
-            for f in files:
-                file_path = os.path.join(root, f)
-                try:
-                    with open(file_path, 'rb') as fp:
-                        fp.seek(128)
-                        if fp.read(4) == b'DICM':
-                            dicom_files.append(file_path)
-                except:
-                    continue
+        if dicom_files is None:
+            dicom_files = find_dicom_files(dicom_dir)
         
         if not dicom_files:
             raise ValueError("No DICOM files found for metadata extraction")
@@ -156,54 +156,123 @@ def convert_dicom_to_nifti(dicom_dir, output_path):
         logger.error(f"DICOM to NIfTI conversion failed: {str(e)}")
         raise RuntimeError(f"Conversion failed: {str(e)}")
     
-def verify_dicom_files(dicom_dir):
-    """Enhanced verification with pixel data check"""
+def verify_dicom_files(dicom_dir, dicom_files=None):
+    """Enhanced verification with pixel data check
+
+    Pass dicom_files to verify one series out of a directory holding several.
+    """
+    import pydicom
+
+    if dicom_files is None:
+        dicom_files = [os.path.join(root, f) for root, _, files in os.walk(dicom_dir) for f in files]
+
     valid_files = []
-    for root, _, files in os.walk(dicom_dir):
-        for f in files:
-            file_path = os.path.join(root, f)
-            try:
-                # Check DICOM signature
-                with open(file_path, 'rb') as fp:
-                    fp.seek(128)
-                    if fp.read(4) != b'DICM':
-                        continue
-                
-                # Try reading FULL file with pydicom
-                ds = pydicom.dcmread(file_path)
-                
-                # Essential checks
-                if not hasattr(ds, 'pixel_array'):
-                    logging.warning(f"File {file_path} has no pixel data")
-                    continue
-                    
-                if not hasattr(ds, 'Rows') or not hasattr(ds, 'Columns'):
-                    logging.warning(f"File {file_path} missing geometry info")
-                    continue
-                    
-                # Quick pixel array check
-                try:
-                    test_array = ds.pixel_array
-                    if test_array.size == 0:
-                        logging.warning(f"File {file_path} has empty pixel array")
-                        continue
-                except:
-                    logging.warning(f"File {file_path} has unreadable pixel data")
+    for file_path in dicom_files:
+        try:
+            # Check DICOM signature
+            with open(file_path, 'rb') as fp:
+                fp.seek(128)
+                if fp.read(4) != b'DICM':
                     continue
+            
+            # Try reading FULL file with pydicom
+            ds = pydicom.dcmread(file_path)
+            
+            # Essential checks
+            if not hasattr(ds, 'pixel_array'):
+                logging.warning(f"File {file_path} has no pixel data")
+                continue
                 
-                valid_files.append(file_path)
+            if not hasattr(ds, 'Rows') or not hasattr(ds, 'Columns'):
+                logging.warning(f"File {file_path} missing geometry info")
+                continue
                 
-            except Exception as e:
-                logging.warning(f"File {file_path} failed verification: {str(e)}")
+            # Quick pixel array check
+            try:
+                test_array = ds.pixel_array
+                if test_array.size == 0:
+                    logging.warning(f"File {file_path} has empty pixel array")
+                    continue
+            except:
+                logging.warning(f"File {file_path} has unreadable pixel data")
                 continue
-    
+            
+            valid_files.append(file_path)
+            
+        except Exception as e:
+            logging.warning(f"File {file_path} failed verification: {str(e)}")
+            continue
+
     if not valid_files:
         raise ValueError(f"No valid DICOM files with pixel data found in {dicom_dir}")
     
     return valid_files
 
+def discover_series(upload_dir, min_slices=MIN_SERIES_SLICES):
+    """Split an upload into the series eligible for study-level inference
+
+    DICOM files are grouped by SeriesInstanceUID and ordered by InstanceNumber;
+    each 3D/4D NIfTI file is its own series. Localizers and series shorter than
+    min_slices are skipped.
+    """
+    import nibabel as nib
+    import pydicom
+
+    series = []
+
+    groups = {}
+    for file_path in find_dicom_files(upload_dir):
+        try:
+            ds = pydicom.dcmread(file_path, stop_before_pixels=True)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable DICOM header {file_path}: {str(e)}")
+            continue
+        if not hasattr(ds, 'Rows') or not hasattr(ds, 'Columns'):
+            continue
+        if 'LOCALIZER' in [str(v).upper() for v in getattr(ds, 'ImageType', [])]:
+            continue
+        uid = str(getattr(ds, 'SeriesInstanceUID', 'unknown'))
+        group = groups.setdefault(uid, {"description": str(getattr(ds, 'SeriesDescription', '')), "slices": []})
+        group["slices"].append((int(getattr(ds, 'InstanceNumber', 0) or 0), file_path))
+
+    for uid, group in groups.items():
+        if len(group["slices"]) < min_slices:
+            logger.info(f"Skipping DICOM series {uid}: {len(group['slices'])} slices")
+            continue
+        series.append({
+            "series_id": uid,
+            "kind": "dicom",
+            "description": group["description"],
+            "files": [f for _, f in sorted(group["slices"])]
+        })
+
+    for root, _, files in os.walk(upload_dir):
+        for f in sorted(files):
+            if not (f.endswith('.nii') or f.endswith('.nii.gz')):
+                continue
+            file_path = os.path.join(root, f)
+            try:
+                shape = nib.load(file_path).shape
+            except Exception as e:
+                logger.warning(f"Skipping unreadable NIfTI {file_path}: {str(e)}")
+                continue
+            # Axial CT has far fewer slices than in-plane pixels, so the shortest axis is Z
+            if len(shape) not in (3, 4) or min(shape[:3]) < min_slices:
+                continue
+            series.append({
+                "series_id": f,
+                "kind": "nifti",
+                "description": "",
+                "path": file_path
+            })
+
+    return series
+
 def save_compressed_nifti(sitk_image, output_path, compress=True):
     """Save as .nii.gz using NiBabel with proper compression."""
+    import SimpleITK as sitk
+    import nibabel as nib
+
     image_array = sitk.GetArrayFromImage(sitk_image)  # shape (D,H,W)
     affine = np.eye(4)  # Replace with correct affine if needed
     
@@ -218,6 +287,8 @@ def save_compressed_nifti(sitk_image, output_path, compress=True):
 
 def load_and_preprocess_nifti(nifti_path, transforms=None):
     """Robust NIfTI loading with dimension validation and reorientation"""
+    import nibabel as nib
+
     try:
         # Load NIfTI file
         img = nib.load(str(nifti_path))
@@ -255,16 +326,41 @@ def load_and_preprocess_nifti(nifti_path, transforms=None):
         logger.error(f"NIfTI loading failed: {str(e)}")
         raise RuntimeError(f"Could not load NIfTI: {str(e)}")
     
-# Updated transform pipeline for inference - does NOT include LoadImage (you load explicitly above)
-test_transforms = Compose([
-    EnsureChannelFirst(channel_dim=0),  # already channel first, but safe to keep
-    EnsureType(),
-    Orientation(axcodes="RAS"),
-    Spacing(pixdim=(1.0, 1.0, 1.0), mode="bilinear"),
-    Resize(spatial_size=config.IMAGE_SIZE),
-    NormalizeIntensity(nonzero=True, channel_wise=True),
-    ToTensor()
-]) 
+@lru_cache(maxsize=None)
+def build_test_transforms(spatial_size=config.IMAGE_SIZE, pixdim=(1.0, 1.0, 1.0)):
+    """Inference transform pipeline resized to the given spatial size
+
+    The volume reaches these transforms as a plain array with no affine, so MONAI
+    treats voxels as 1 mm and Spacing works on the voxel grid, not physical spacing.
+    Pass pixdim=None to leave Spacing out.
+    """
+    from monai.transforms import Compose, EnsureChannelFirst, EnsureType, Orientation, Spacing, Resize, NormalizeIntensity, ToTensor
+
+    return Compose([
+        EnsureChannelFirst(channel_dim=0),  # already channel first, but safe to keep
+        EnsureType(),
+        Orientation(axcodes="RAS"),
+        *([Spacing(pixdim=pixdim, mode="bilinear")] if pixdim is not None else []),
+        Resize(spatial_size=spatial_size),
+        NormalizeIntensity(nonzero=True, channel_wise=True),
+        ToTensor()
+    ])
+
+def build_coarse_test_transforms():
+    """Low-resolution pipeline for the coarse screening tier of the resolution cascade"""
+    # Resize alone downsamples the grid; an extra Spacing pass would only resample twice
+    return build_test_transforms(config.COARSE_IMAGE_SIZE, pixdim=None)
+
+def __getattr__(name):
+    """Build MONAI pipelines and the torch Dataset only when first accessed"""
+    if name == "test_transforms":
+        return build_test_transforms()
+    if name == "coarse_test_transforms":
+        return build_coarse_test_transforms()
+    if name == "RSNADataset":
+        from dataset import RSNADataset
+        return RSNADataset
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def convert_labels_to_targets(label_dict):
     # Binary targets: injury only
@@ -290,57 +386,10 @@ def convert_labels_to_targets(label_dict):
         "spleen": spleen,
     }
 
-class RSNADataset(Dataset):
-    def __init__(self, metadata_list, transforms=None, has_labels=True):
-        """
-        Initialize the dataset
-        
-        Args:
-            metadata_list: List of dictionaries containing scan metadata
-            transforms: Optional transforms to apply
-            has_labels: Whether the dataset includes labels
-        """
-        self.metadata_list = metadata_list
-        self.transforms = transforms
-        self.has_labels = has_labels
-
-    def __len__(self):
-        return len(self.metadata_list)
-
-    def __getitem__(self, idx):
-        entry = self.metadata_list[idx]
-        try:
-            nifti_path = entry["nifti_path"]
-            
-            # Load with validation
-            volume = load_and_preprocess_nifti(nifti_path)
-            
-            # Apply transforms if they exist
-            if self.transforms:
-                volume = self.transforms(volume)
-            
-            # Create sample
-            sample = {"image": MetaTensor(volume)}
-            
-            if self.has_labels:
-                targets = convert_labels_to_targets(entry['labels'])
-                sample["label"] = torch.tensor([
-                    targets["bowel"],
-                    targets["extra"],
-                    targets["kidney"],
-                    targets["liver"],
-                    targets["spleen"]
-                ], dtype=torch.float32)
-                
-            return sample
-            
-        except Exception as e:
-            logger.error(f"Failed to process {nifti_path}: {str(e)}")
-            raise ValueError(f"Error processing {nifti_path}: {str(e)}")
-        
-
 def repair_nifti(input_path, output_path=None):
     """Attempt to repair malformed NIfTI files"""
+    import nibabel as nib
+
     try:
         img = nib.load(str(input_path))
         data = img.get_fdata()
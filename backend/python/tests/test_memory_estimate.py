@@ -0,0 +1,142 @@
+import json
+import math
+
+import pytest
+
+import config
+import memory_estimate
+from memory_estimate import (
+    estimate_peak_memory,
+    load_calibration,
+    calibrate,
+    BASE_BYTES,
+    LOAD_BYTES_PER_VOXEL,
+    RESAMPLE_INPUT_BYTES_PER_VOXEL,
+    RESAMPLE_OUTPUT_BYTES_PER_VOXEL,
+    DICOM_BYTES_PER_VOXEL
+)
+
+UNCALIBRATED = {"base_bytes": 0, "scale": 1.0, "headroom_bytes": 0}
+
+
+@pytest.fixture
+def geometry(monkeypatch):
+    """Replace header reading with a fixed geometry"""
+    def use(shape, frames=1, source="nifti", zooms=(0.8, 0.8, 5.0)):
+        monkeypatch.setattr(memory_estimate, "read_scan_geometry", lambda _: {
+            "shape": shape, "frames": frames, "zooms": zooms, "source": source
+        })
+    return use
+
+
+def test_small_volume_peaks_at_model_input(geometry):
+    geometry((10, 10, 10))
+    estimate = estimate_peak_memory("scan.nii.gz", UNCALIBRATED)
+    assert estimate["peak_stage"] == "model_input"
+    assert estimate["working_bytes"] == 4 * math.prod(config.IMAGE_SIZE)
+
+
+def test_resample_uses_native_grid_regardless_of_spacing(geometry):
+    geometry((96, 96, 40), zooms=(0.8, 0.8, 5.0))
+    thick = estimate_peak_memory("scan.nii.gz", UNCALIBRATED)
+    geometry((96, 96, 40), zooms=(1.0, 1.0, 1.0))
+    unit = estimate_peak_memory("scan.nii.gz", UNCALIBRATED)
+
+    voxels = 96 * 96 * 40
+    assert thick["peak_stage"] == "resample"
+    assert thick["working_bytes"] == (RESAMPLE_INPUT_BYTES_PER_VOXEL + RESAMPLE_OUTPUT_BYTES_PER_VOXEL) * voxels
+    assert thick["working_bytes"] == unit["working_bytes"]
+
+
+def test_4d_load_counts_every_frame(geometry):
+    geometry((256, 256, 100), frames=3)
+    estimate = estimate_peak_memory("scan.nii.gz", UNCALIBRATED)
+    assert estimate["peak_stage"] == "load"
+    assert estimate["working_bytes"] == LOAD_BYTES_PER_VOXEL * 256 * 256 * 100 * 3
+
+
+def test_dicom_stage_only_for_dicom_sources(geometry):
+    geometry((256, 256, 100), source="dicom")
+    dicom = estimate_peak_memory("scan_dir", UNCALIBRATED)
+    geometry((256, 256, 100), source="nifti")
+    nifti = estimate_peak_memory("scan.nii.gz", UNCALIBRATED)
+    # The DICOM stage is never the peak on its own, but must not change the NIfTI path
+    assert DICOM_BYTES_PER_VOXEL < RESAMPLE_INPUT_BYTES_PER_VOXEL + RESAMPLE_OUTPUT_BYTES_PER_VOXEL
+    assert dicom["working_bytes"] == nifti["working_bytes"]
+
+
+def test_calibration_is_applied(geometry):
+    geometry((256, 256, 100))
+    calibration = {"base_bytes": 1000, "scale": 2.0, "headroom_bytes": 50}
+    estimate = estimate_peak_memory("scan.nii.gz", calibration)
+    assert estimate["predicted_peak_bytes"] == 1000 + 2 * estimate["working_bytes"] + 50
+
+
+def test_load_calibration_defaults_and_overrides(tmp_path):
+    assert load_calibration(tmp_path / "missing.json") == {
+        "base_bytes": BASE_BYTES, "scale": 1.0, "headroom_bytes": 0
+    }
+
+    partial = tmp_path / "partial.json"
+    partial.write_text(json.dumps({"scale": 1.5}))
+    assert load_calibration(partial) == {"base_bytes": BASE_BYTES, "scale": 1.5, "headroom_bytes": 0}
+
+    broken = tmp_path / "broken.json"
+    broken.write_text("{not json")
+    assert load_calibration(broken)["scale"] == 1.0
+
+
+def write_records(path, pairs):
+    with open(path, "w") as f:
+        for working, actual in pairs:
+            f.write(json.dumps({"working_bytes": working, "actual_peak_bytes": actual}) + "\n")
+        # OOM-killed runs have no measured peak and must be ignored
+        f.write(json.dumps({"working_bytes": 123, "actual_peak_bytes": None, "oomKilled": True}) + "\n")
+        f.write("\n")
+
+
+def test_calibrate_fits_base_and_scale(tmp_path):
+    pytest.importorskip("numpy")
+    records = tmp_path / "records.jsonl"
+    write_records(records, [(1000, 3000), (2000, 5000), (4000, 9000)])
+
+    output = tmp_path / "calibration.json"
+    fitted = calibrate(records, output)
+
+    assert fitted["scale"] == pytest.approx(2.0)
+    assert fitted["base_bytes"] == pytest.approx(1000, abs=1)
+    assert fitted["headroom_bytes"] <= 1
+    assert fitted["samples"] == 3
+    assert json.loads(output.read_text()) == fitted
+
+
+def test_calibrate_constant_working_bytes(tmp_path):
+    pytest.importorskip("numpy")
+    records = tmp_path / "records.jsonl"
+    write_records(records, [(1000, 2500), (1000, 3500)])
+
+    fitted = calibrate(records, tmp_path / "calibration.json")
+
+    # ptp == 0: no slope to fit, so keep scale 1 and absorb the mean offset into base
+    assert fitted["scale"] == 1.0
+    assert fitted["base_bytes"] == 2000
+    assert fitted["headroom_bytes"] == 500
+
+
+def test_calibrate_needs_two_records(tmp_path):
+    records = tmp_path / "records.jsonl"
+    write_records(records, [(1000, 3000)])
+    with pytest.raises(ValueError):
+        calibrate(records, tmp_path / "calibration.json")
+
+
+def test_nifti_header_geometry_counts_frames(tmp_path):
+    np = pytest.importorskip("numpy")
+    nib = pytest.importorskip("nibabel")
+    path = tmp_path / "dynamic.nii.gz"
+    nib.save(nib.Nifti1Image(np.zeros((8, 8, 4, 3), dtype=np.int16), np.eye(4)), str(path))
+
+    geometry = memory_estimate.read_scan_geometry(path)
+    assert geometry["shape"] == (8, 8, 4)
+    assert geometry["frames"] == 3
+    assert geometry["source"] == "nifti"
@@ -0,0 +1,113 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from inference import aggregate_outputs, postprocess_output
+
+
+def series_outputs(bowel_probs, liver_probs):
+    """Per-series logits [S, C] for the five heads from bowel and liver probabilities"""
+    bowel = torch.logit(torch.tensor(bowel_probs)).unsqueeze(1)
+    liver = torch.log(torch.tensor(liver_probs))
+    healthy = torch.log(torch.tensor([[0.98, 0.01, 0.01]] * len(bowel_probs)))
+    return {
+        "bowel": bowel,
+        "extra": torch.logit(torch.full((len(bowel_probs), 1), 0.1)),
+        "liver": liver,
+        "kidney": healthy,
+        "spleen": healthy
+    }
+
+
+OUTPUTS = series_outputs([0.2, 0.8], [[0.9, 0.05, 0.05], [0.3, 0.6, 0.1]])
+
+
+def test_mean_aggregation_round_trips_through_postprocess():
+    results = postprocess_output(aggregate_outputs(OUTPUTS, "mean"))
+    assert results["bowel"]["probability"] == pytest.approx(0.5, abs=1e-4)
+    assert results["liver"]["probabilities"] == pytest.approx([0.6, 0.325, 0.075], abs=1e-4)
+    assert results["extravasation"]["probability"] == pytest.approx(0.1, abs=1e-4)
+
+
+def test_max_aggregation_keeps_most_injured_series():
+    results = postprocess_output(aggregate_outputs(OUTPUTS, "max"))
+    assert results["bowel"]["probability"] == pytest.approx(0.8, abs=1e-4)
+    assert results["bowel"]["status"] == "Injured"
+    # Lowest healthy, highest low/high injury, renormalised (already sums to 1 here)
+    assert results["liver"]["probabilities"] == pytest.approx([0.3, 0.6, 0.1], abs=1e-4)
+    assert results["liver"]["status"] == "Low Injury"
+
+
+def test_single_series_is_unchanged():
+    single = {k: v[:1] for k, v in OUTPUTS.items()}
+    expected = postprocess_output(single)
+    for rule in ("max", "mean"):
+        results = postprocess_output(aggregate_outputs(single, rule))
+        assert results["bowel"]["probability"] == pytest.approx(expected["bowel"]["probability"], abs=1e-4)
+        assert results["liver"]["probabilities"] == pytest.approx(expected["liver"]["probabilities"], abs=1e-4)
+        assert all(results[head]["status"] == expected[head]["status"] for head in expected)
+
+
+def test_unknown_rule_is_rejected():
+    with pytest.raises(ValueError):
+        aggregate_outputs(OUTPUTS, "median")
+
+
+def test_discover_series_skips_short_nifti(tmp_path):
+    np = pytest.importorskip("numpy")
+    nib = pytest.importorskip("nibabel")
+    pytest.importorskip("pydicom")
+    from preprocessing import discover_series
+
+    nib.save(nib.Nifti1Image(np.zeros((40, 40, 25), dtype=np.int16), np.eye(4)), str(tmp_path / "portal.nii.gz"))
+    nib.save(nib.Nifti1Image(np.zeros((64, 64, 5), dtype=np.int16), np.eye(4)), str(tmp_path / "scout.nii.gz"))
+
+    series = discover_series(tmp_path, min_slices=20)
+    assert [s["series_id"] for s in series] == ["portal.nii.gz"]
+
+
+class FakeModel(torch.nn.Module):
+    """Returns healthy logits for every item in the batch"""
+    def forward(self, x):
+        return series_outputs([0.2] * x.shape[0], [[0.9, 0.05, 0.05]] * x.shape[0])
+
+
+def test_failed_series_is_reported_and_left_out(monkeypatch, tmp_path):
+    import inference
+
+    def prepare(index, series, work_dir):
+        if series["series_id"] == "corrupt":
+            raise RuntimeError("unreadable pixel data")
+        return torch.zeros(1, 4, 4, 4)
+
+    monkeypatch.setattr(inference, "discover_series", lambda _: [
+        {"series_id": sid, "kind": "dicom", "description": sid, "files": []}
+        for sid in ("arterial", "corrupt", "portal")
+    ])
+    monkeypatch.setattr(inference, "_prepare_series_tensor", prepare)
+
+    results = inference.run_study_inference(tmp_path, FakeModel(), tta_fns=inference.DEFAULT_TTA_FNS)
+
+    assert results["study"]["num_series"] == 2
+    assert results["study"]["failed_series"] == 1
+    assert [s["series_id"] for s in results["series"]] == ["arterial", "corrupt", "portal"]
+    assert results["series"][1] == {
+        "series_id": "corrupt", "description": "corrupt", "error": "unreadable pixel data"
+    }
+    assert results["series"][2]["tta"] == {"mode": "full", "views": 4, "max_views": 4}
+    assert results["tta"] == {"mode": "full", "views": 8, "max_views": 8}
+
+
+def test_study_with_no_usable_series_raises(monkeypatch, tmp_path):
+    import inference
+
+    def prepare(index, series, work_dir):
+        raise RuntimeError("unreadable pixel data")
+
+    monkeypatch.setattr(inference, "discover_series", lambda _: [
+        {"series_id": "corrupt", "kind": "dicom", "description": "", "files": []}
+    ])
+    monkeypatch.setattr(inference, "_prepare_series_tensor", prepare)
+
+    with pytest.raises(RuntimeError, match="corrupt: unreadable pixel data"):
+        inference.run_study_inference(tmp_path, FakeModel())
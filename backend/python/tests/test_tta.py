@@ -0,0 +1,91 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from inference import (
+    _uncertain_mask,
+    _adaptive_tta_forward_batch,
+    DEFAULT_THRESHOLDS,
+    DEFAULT_TTA_FNS
+)
+
+HEADS = ["bowel", "extra", "liver", "kidney", "spleen"]
+
+
+def item_logits(bowel=0.05, extra=0.05, liver=(0.98, 0.01, 0.01), kidney=(0.98, 0.01, 0.01),
+                spleen=(0.98, 0.01, 0.01)):
+    """Logits whose sigmoid/softmax give the requested probabilities"""
+    return {
+        "bowel": torch.logit(torch.tensor([bowel])),
+        "extra": torch.logit(torch.tensor([extra])),
+        "liver": torch.log(torch.tensor(liver)),
+        "kidney": torch.log(torch.tensor(kidney)),
+        "spleen": torch.log(torch.tensor(spleen))
+    }
+
+
+def batch(*items):
+    return {head: torch.stack([item[head] for item in items]) for head in HEADS}
+
+
+class FixedLogitsModel:
+    """Returns preset logits per batch item, keyed by the item's constant voxel value
+
+    Every call after the first adds its call index to the logits so merged views are
+    distinguishable from the identity view.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.batch_sizes = []
+
+    def __call__(self, x):
+        offset = float(len(self.batch_sizes))
+        self.batch_sizes.append(x.shape[0])
+        ids = x[:, 0, 0, 0, 0].long().tolist()
+        return {head: torch.stack([self.items[i][head] for i in ids]) + offset for head in HEADS}
+
+
+def constant_volumes(n):
+    return torch.arange(n, dtype=torch.float32).view(n, 1, 1, 1, 1).expand(n, 1, 2, 2, 2).clone()
+
+
+def test_confident_item_is_not_uncertain():
+    outputs = batch(item_logits())
+    assert not _uncertain_mask(outputs, DEFAULT_THRESHOLDS, margin=0.1).any()
+
+
+def test_probability_near_threshold_is_uncertain():
+    outputs = batch(item_logits(), item_logits(bowel=0.52))
+    assert _uncertain_mask(outputs, DEFAULT_THRESHOLDS, margin=0.1).tolist() == [False, True]
+
+
+def test_close_valid_classes_are_uncertain():
+    thresholds = {**DEFAULT_THRESHOLDS, "liver": {"thresholds": [0.9, 0.2, 0.2]}}
+    tied = item_logits(liver=(0.02, 0.49, 0.49))
+    clear = item_logits(liver=(0.02, 0.95, 0.03))
+    assert _uncertain_mask(batch(tied, clear), thresholds, margin=0.1).tolist() == [True, False]
+
+
+def test_adaptive_tta_only_augments_uncertain_items():
+    items = [item_logits(), item_logits(bowel=0.52)]
+    model = FixedLogitsModel(items)
+
+    outputs, views = _adaptive_tta_forward_batch(
+        model, constant_volumes(2), DEFAULT_TTA_FNS, DEFAULT_THRESHOLDS, margin=0.1
+    )
+
+    assert views == [1, len(DEFAULT_TTA_FNS)]
+    assert model.batch_sizes == [2] + [1] * (len(DEFAULT_TTA_FNS) - 1)
+    # Confident item keeps its identity logits; the uncertain one averages offsets 0..3
+    mean_offset = sum(range(len(DEFAULT_TTA_FNS))) / len(DEFAULT_TTA_FNS)
+    for head in HEADS:
+        assert torch.allclose(outputs[head][0], items[0][head])
+        assert torch.allclose(outputs[head][1], items[1][head] + mean_offset)
+
+
+def test_adaptive_tta_single_pass_when_all_confident():
+    model = FixedLogitsModel([item_logits(), item_logits()])
+    _, views = _adaptive_tta_forward_batch(model, constant_volumes(2), DEFAULT_TTA_FNS, DEFAULT_THRESHOLDS, 0.1)
+    assert views == [1, 1]
+    assert model.batch_sizes == [2]
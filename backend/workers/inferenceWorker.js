@@ -2,6 +2,68 @@ const { spawn } = require('child_process');
 const Scan = require('../models/Scan');
 const Model = require('../models/Model');
 const path = require('path');
+const fs = require('fs');
+const os = require('os');
+
+const PYTHON_DIR = path.resolve(__dirname, '../python');
+
+// Host memory the worker may hand out to concurrent inference processes
+const MEMORY_BUDGET_BYTES = process.env.INFERENCE_MEMORY_BUDGET_MB
+  ? Number(process.env.INFERENCE_MEMORY_BUDGET_MB) * 1024 * 1024
+  : Math.floor(os.totalmem() * 0.75);
+
+// Predicted vs. actual peak RSS, one JSON line per scan (see memory_estimate.py --calibrate)
+const CALIBRATION_LOG = process.env.MEMORY_CALIBRATION_LOG
+  || path.resolve(__dirname, '../logs/memory-calibration.jsonl');
+
+const running = new Map(); // scanId -> { predictedBytes, exclusive }
+let reservedBytes = 0;
+let scheduling = false;
+
+const toMB = (bytes) => (bytes == null ? 'unknown' : `${Math.round(bytes / 1024 / 1024)} MB`);
+
+function runPython(args) {
+  return new Promise((resolve, reject) => {
+    let output = '';
+    let errorOutput = '';
+
+    const pyProcess = spawn('python', args);
+
+    pyProcess.stdout.on('data', (data) => {
+      output += data.toString();
+    });
+
+    pyProcess.stderr.on('data', (data) => {
+      const errText = data.toString();
+      console.error('Python error:', errText);
+      errorOutput += errText;
+    });
+
+    pyProcess.on('error', reject);
+
+    pyProcess.on('close', (code, signal) => {
+      resolve({ code, signal, output, errorOutput });
+    });
+  });
+}
+
+// Returns null when no estimate is available; the scheduler then runs the scan alone
+async function estimateMemory(scan) {
+  try {
+    const { code, output, errorOutput } = await runPython([
+      path.join(PYTHON_DIR, 'memory_estimate.py'),
+      path.resolve(scan.filePath),
+    ]);
+    if (code !== 0) {
+      console.error(`Memory estimate failed for scan ${scan._id}: ${errorOutput}`);
+      return null;
+    }
+    return JSON.parse(output);
+  } catch (err) {
+    console.error(`Memory estimate failed for scan ${scan._id}:`, err);
+    return null;
+  }
+}
 
 async function runInference(scan) {
   // Fetch active model from DB
@@ -12,59 +74,59 @@ async function runInference(scan) {
   const scanFilePath = path.resolve(scan.filePath);
   const modelFilePath = path.resolve(activeModel.filePath);
 
-  return new Promise((resolve, reject) => {
-  let output = '';
-  let errorOutput = '';
-
-  const pyProcess = spawn('python', [
-    path.resolve(__dirname, '../python/inference.py'),
+  const { code, signal, output, errorOutput } = await runPython([
+    path.join(PYTHON_DIR, 'inference.py'),
     scanFilePath,
     modelFilePath,
   ]);
+  console.log(`Python process exited with code ${code}${signal ? ` (signal ${signal})` : ''}`);
 
-  pyProcess.stdout.on('data', (data) => {
-    const text = data.toString();
-    console.log("Python stdout:", text);  // <-- log what python prints
-    output += text;
-  });
-
-  pyProcess.stderr.on('data', (data) => {
-    const errText = data.toString();
-    console.error('Python error:', errText);
-    errorOutput += errText;
-  });
+  if (signal === 'SIGKILL' || code === 137) {
+    const err = new Error(
+      `Inference process was killed, most likely out of memory ` +
+      `(predicted peak ${toMB(scan.memory?.predictedPeakBytes)}, budget ${toMB(MEMORY_BUDGET_BYTES)})`
+    );
+    err.oomKilled = true;
+    throw err;
+  }
+  if (code !== 0) {
+    throw new Error(`Python exited with code ${code}. Stderr: ${errorOutput}`);
+  }
 
-  pyProcess.on('close', (code) => {
-    console.log(`Python process exited with code ${code}`);
-    if (code !== 0) {
-      reject(new Error(`Python exited with code ${code}. Stderr: ${errorOutput}`));
-    } else {
-      try {
-        console.log("Raw output from Python:", output); // <-- check raw output here
-        const results = JSON.parse(output);
-        console.log("Parsed results:", results);  // <-- check parsed results here
-        resolve(results);
-      } catch (e) {
-        console.error("JSON parse error:", e);
-        reject(e);
-      }
-    }
-  });
-});
+  console.log("Raw output from Python:", output); // <-- check raw output here
+  const results = JSON.parse(output);
+  console.log("Parsed results:", results);  // <-- check parsed results here
+  return results;
 }
 
-async function processScanQueue() {
-  const scan = await Scan.findOne({ status: "Queued" });
-  if (!scan) return;
-
+function recordCalibration(scan, actualPeakBytes, extra = {}) {
+  const record = {
+    scanId: String(scan._id),
+    working_bytes: scan.memory?.workingBytes ?? null,
+    predicted_peak_bytes: scan.memory?.predictedPeakBytes ?? null,
+    actual_peak_bytes: actualPeakBytes ?? null,
+    exclusive: Boolean(scan.memory?.exclusive),
+    concurrent: running.size,
+    timestamp: new Date().toISOString(),
+    ...extra,
+  };
   try {
-    scan.status = "Processing";
-    scan.startedAt = new Date(); // optional: track start
-    await scan.save();
+    fs.mkdirSync(path.dirname(CALIBRATION_LOG), { recursive: true });
+    fs.appendFileSync(CALIBRATION_LOG, JSON.stringify(record) + '\n');
+  } catch (err) {
+    console.error('Failed to write memory calibration record:', err);
+  }
+}
 
+async function processScan(scan) {
+  try {
     const results = await runInference(scan);
     console.log(`Scan ${scan._id} predictions:`, results);
 
+    const actualPeakBytes = results.memory?.actual_peak_bytes;
+    scan.memory.actualPeakBytes = actualPeakBytes;
+    recordCalibration(scan, actualPeakBytes);
+
     scan.results = results;
     scan.status = "Completed";
     scan.completedAt = new Date(); // ✅ add this line
@@ -73,8 +135,86 @@ async function processScanQueue() {
     console.log(`Processed scan ${scan._id} successfully.`);
   } catch (err) {
     console.error(`Failed to process scan ${scan._id}`, err);
+    if (err.oomKilled) recordCalibration(scan, null, { oomKilled: true });
     scan.status = "Failed";
+    scan.error = { message: err.message, stack: err.stack, timestamp: new Date() };
     await scan.save();
+  } finally {
+    const slot = running.get(String(scan._id));
+    if (slot) reservedBytes -= slot.predictedBytes;
+    running.delete(String(scan._id));
+  }
+}
+
+async function admit(scan, predictedBytes, exclusive) {
+  scan.status = "Processing";
+  scan.startedAt = new Date(); // optional: track start
+  scan.memory.exclusive = exclusive;
+  await scan.save();
+
+  // Reserve only once the scan is persisted as Processing, so a failed save leaks nothing
+  running.set(String(scan._id), { predictedBytes: predictedBytes || 0, exclusive });
+  reservedBytes += predictedBytes || 0;
+
+  console.log(
+    `Admitted scan ${scan._id} (predicted ${toMB(predictedBytes)}, ` +
+    `reserved ${toMB(reservedBytes)} of ${toMB(MEMORY_BUDGET_BYTES)}${exclusive ? ', running alone' : ''})`
+  );
+  processScan(scan).catch((err) => console.error(`Worker error on scan ${scan._id}`, err));
+}
+
+async function failScan(scan, err) {
+  console.error(`Failed to schedule scan ${scan._id}`, err);
+  try {
+    scan.status = "Failed";
+    scan.error = { message: err.message, stack: err.stack, timestamp: new Date() };
+    await scan.save();
+  } catch (saveErr) {
+    console.error(`Failed to mark scan ${scan._id} as Failed`, saveErr);
+  }
+}
+
+async function processScanQueue() {
+  if (scheduling) return;
+  scheduling = true;
+  try {
+    // An oversized scan has the host to itself until it finishes
+    if ([...running.values()].some((slot) => slot.exclusive)) return;
+
+    const queued = await Scan.find({ status: "Queued" }).sort({ createdAt: 1 });
+    for (const scan of queued) {
+      if (running.has(String(scan._id))) continue;
+
+      try {
+        // Header-only estimate, computed once per scan before anything is decoded
+        if (!scan.memory?.estimatedAt) {
+          const estimate = await estimateMemory(scan);
+          scan.memory = {
+            predictedPeakBytes: estimate?.predicted_peak_bytes,
+            workingBytes: estimate?.working_bytes,
+            peakStage: estimate?.peak_stage,
+            estimatedAt: new Date(),
+          };
+          await scan.save();
+        }
+
+        const predicted = scan.memory.predictedPeakBytes;
+        const exclusive = predicted == null || predicted > MEMORY_BUDGET_BYTES;
+
+        // Admit strictly in queue order so large scans are not starved by small ones
+        if (exclusive) {
+          if (running.size === 0) await admit(scan, predicted, true);
+          break;
+        }
+        if (reservedBytes + predicted > MEMORY_BUDGET_BYTES) break;
+        await admit(scan, predicted, false);
+      } catch (err) {
+        // One bad scan must not stall everything queued behind it
+        await failScan(scan, err);
+      }
+    }
+  } finally {
+    scheduling = false;
   }
 }
 